@@ -1,38 +1,81 @@
 import os
-import frontmatter
+import re
+import yaml
 from jinja2 import Environment, FileSystemLoader
 from datetime import datetime  # Import datetime
 
+# Use the libyaml parser when PyYAML was built with it
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+_delimiter_re = re.compile(r"^-{3,}\s*$")
+
+
+def scan_markdown_files(path):
+    """
+    Recursively yields the path and last modified date of every markdown file
+    under `path`, in the same order as `os.walk`. Symlinks are not followed.
+    """
+    subdirs = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+            elif entry.is_file(follow_symlinks=False) and entry.name.endswith(".md"):
+                yield entry.path, entry.stat().st_mtime
+    for subdir in subdirs:
+        yield from scan_markdown_files(subdir)
+
+
+def read_front_matter(filepath):
+    """
+    Parses the YAML front matter of a markdown file, without reading the
+    rest of the document.
+    """
+    with open(filepath, "r") as f:
+        # Like python-frontmatter, ignore leading whitespace
+        for line in f:
+            if line.strip():
+                break
+        else:
+            return {}
+        if not _delimiter_re.match(line):
+            return {}
+        header_lines = []
+        for line in f:
+            if _delimiter_re.match(line):
+                break
+            header_lines.append(line)
+        else:
+            return {}  # Front matter is never closed
+    metadata = yaml.load("".join(header_lines), Loader=SafeLoader)
+    return metadata if isinstance(metadata, dict) else {}
+
+
+def parse_rfc(filepath, last_modified):
+    """
+    Reads the front matter of an RFC document into the fields used by the index.
+    """
+    post = read_front_matter(filepath)
+    return {
+        "title": post.get("title"),
+        "abstract": post.get("abstract"),
+        "sotd": post.get("sotd"),
+        "shortName": post.get("shortName"),
+        "editor": post.get("editor"),
+        "link": filepath.replace("source/", "rfcs/").replace(".md", ".html"),
+        "updated": datetime.fromtimestamp(last_modified).strftime("%B %d, %Y"),
+    }
+
 
 def generate_rfc_page():
     """
     Generates an HTML page listing RFC documents using Jinja2 templating.
     """
 
-    rfcs = []
-    for root, _, files in os.walk("source/"):
-        for file in files:
-            if file.endswith(".md"):
-                filepath = os.path.join(root, file)
-                with open(filepath, "r") as f:
-                    post = frontmatter.load(f)
-                    # Get last modified date of the file
-                    last_modified = os.path.getmtime(filepath)
-                    rfcs.append(
-                        {
-                            "title": post.get("title"),
-                            "abstract": post.get("abstract"),
-                            "sotd": post.get("sotd"),
-                            "shortName": post.get("shortName"),
-                            "editor": post.get("editor"),
-                            "link": filepath.replace("source/", "rfcs/").replace(
-                                ".md", ".html"
-                            ),
-                            "updated": datetime.fromtimestamp(last_modified).strftime(
-                                "%B %d, %Y"
-                            ),
-                        }
-                    )
+    rfcs = [parse_rfc(p, m) for p, m in scan_markdown_files("source/")]
 
     # Setup Jinja2 environment
     env = Environment(loader=FileSystemLoader("."))
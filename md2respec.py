@@ -1,5 +1,9 @@
 import argparse
 import frontmatter
+import functools
+import hashlib
+import io
+import json
 import os
 import latex2mathml.converter
 import markdown
@@ -8,6 +12,12 @@ from string import Template
 from pathlib import Path
 
 template_path = "template.html"
+cache_dir = Path(".cache/md2respec")
+renderer_versions = [markdown.__version__, latex2mathml.__version__]
+script_digest = hashlib.sha256(Path(__file__).read_bytes()).digest()
+
+_base_url_re = re.compile(r'(href|src)="(/[^"]+)"')
+_header_re = re.compile(r"^<h([1-6])>", re.MULTILINE)
 
 
 def convert_markdown_to_html(markdown_file, config):
@@ -19,15 +29,18 @@ def convert_markdown_to_html(markdown_file, config):
       config: A dictionary of configuration options.
 
     Returns:
-      A string containing the HTML output.
+      A tuple of the front matter metadata, the HTML output and the cache key
+      of the document.
     """
 
     try:
         with open(markdown_file, "r") as f:
-            post = frontmatter.load(f)
+            content = f.read()
     except FileNotFoundError:
         raise ValueError("Input file not found")
 
+    post = frontmatter.loads(content)
+
     # Extract front matter
     metadata = {
         "title": post.get("title", "title not present"),
@@ -37,9 +50,34 @@ def convert_markdown_to_html(markdown_file, config):
         "editor": post.get("editor", "editor not present"),
     }
 
+    # Skip the conversion entirely if this exact content was already rendered
+    key = cache_key(content, config)
+    html = read_cache(key)
+    if html is None:
+        html = render_markdown(post.content, config)
+        write_cache(key, html)
+
+    # Apply base URL from environment variable if present
+    base_url = os.environ.get("BASE_URL", "")
+    if base_url:
+        html = apply_base_url(html, base_url)
+
+    return metadata, html, key
+
+
+def render_markdown(content, config):
+    """
+    Renders the body of a markdown file to HTML.
+
+    Args:
+      content: The markdown content, without front matter.
+      config: A dictionary of configuration options.
+
+    Returns:
+      A string containing the HTML output.
+    """
     # Convert Markdown to HTML
-    latex = Latex()
-    html = latex.run(post.content)
+    html = latex.run(content)
     html = markdown.markdown(html, extensions=["fenced_code", "tables"])
     # html = markdown2.markdown(post.content, extras=["fenced-code-blocks", "latex"])
 
@@ -47,12 +85,41 @@ def convert_markdown_to_html(markdown_file, config):
     if config.get("section_headers", False):
         html = apply_section_headers(html)
 
-    # Apply base URL from environment variable if present
-    base_url = os.environ.get("BASE_URL", "")
-    if base_url:
-        html = apply_base_url(html, base_url)
+    return html
+
+
+def cache_key(content, config):
+    """
+    Hashes everything the rendered HTML depends on: the markdown content,
+    the configuration, this script itself and the versions of the libraries
+    doing the rendering (so that changes to the conversion invalidate the cache).
+    """
+    h = hashlib.sha256(content.encode())
+    h.update(json.dumps(config, sort_keys=True).encode())
+    h.update(script_digest)
+    h.update(json.dumps(renderer_versions).encode())
+    return h.hexdigest()[:16]
 
-    return metadata, html
+
+def read_cache(key):
+    try:
+        return (cache_dir / f"{key}.html").read_text()
+    except FileNotFoundError:
+        return None
+
+
+def write_cache(key, html):
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    (cache_dir / f"{key}.html").write_text(html)
+
+
+def prune_cache(keys):
+    """
+    Removes every cache entry whose key is not in `keys`.
+    """
+    for path in cache_dir.glob("*"):
+        if path.stem not in keys:
+            path.unlink()
 
 
 def apply_base_url(html, base_url):
@@ -68,7 +135,7 @@ def apply_base_url(html, base_url):
     """
     # This uses a simple regex to find absolute links.
     # A more robust solution might use an HTML parser.
-    return re.sub(r'(href|src)="(/[^"]+)"', rf'\1="{base_url}\2"', html)
+    return _base_url_re.sub(rf'\1="{base_url}\2"', html)
 
 
 def apply_section_headers(html):
@@ -84,96 +151,118 @@ def apply_section_headers(html):
 
     # Simple implementation for demonstration
     # This could be more robust with a proper HTML parser
-    lines = html.splitlines()
-    new_lines = []
+    close_section = "</section>\n"
+    buf = io.StringIO()
+    last = 0
     section_level = 0
     root_section_level = 0
 
-    for line in lines:
-        if line.startswith("<h"):
-            match = re.match(r"<h(\d)>", line)
-
-            if match:
-                level = int(match.group(1))  # Extract header level (h1, h2, etc.)
-                if root_section_level == 0:
-                    root_section_level = level
-                    assert root_section_level == 2, "First section must be an h2!"
-
-                if level > section_level:  # h2 -> h3
-                    section_level = level
-                elif level < section_level:  # h3 -> h2
-                    new_lines.extend(["</section>"] * (1 + section_level - level))
-                    section_level = level
-                else:  # h2 -> h2
-                    new_lines.append("</section>")
-
-                new_lines.append("<section>")
-        new_lines.append(line)
-
-    new_lines.extend(
-        ["</section>"] * (section_level - 1)
+    for match in _header_re.finditer(html):
+        level = int(match.group(1))  # Extract header level (h1, h2, etc.)
+        if root_section_level == 0:
+            root_section_level = level
+            assert root_section_level == 2, "First section must be an h2!"
+
+        # Copy everything up to the header as is
+        buf.write(html[last : match.start()])
+        last = match.start()
+
+        if level > section_level:  # h2 -> h3
+            section_level = level
+        elif level < section_level:  # h3 -> h2
+            buf.write(close_section * (1 + section_level - level))
+            section_level = level
+        else:  # h2 -> h2
+            buf.write(close_section)
+
+        buf.write("<section>\n")
+
+    buf.write(html[last:])
+    buf.write(
+        "\n</section>" * (section_level - 1)
     )  # Close remaining sections (we assume first section was an h2!)
-    return "\n".join(new_lines)
+    return buf.getvalue()
+
+
+@functools.lru_cache(maxsize=1)
+def load_template():
+    with open(template_path, "r") as f:
+        return Template(f.read())
 
 
 def html_to_respec(metadata, html_content):
     metadata["spec"] = html_content
-    with open(template_path, "r") as f:
-        template_content = f.read()
-    template = Template(template_content)
-    return template.substitute(metadata)
+    return load_template().substitute(metadata)
 
 
 class Latex:
-    _single_dollar_re = re.compile(r"(?<!\$)\$(?!\$)(.*?)\$")
-    _double_dollar_re = re.compile(r"\$\$(.*?)\$\$", re.DOTALL)
+    # Inner matches can't run past a closing delimiter, so they never backtrack
+    _single_dollar_re = re.compile(r"(?<!\$)\$(?!\$)([^$\n]+)\$")
+    _double_dollar_re = re.compile(r"\$\$([^$]*(?:\$(?!\$)[^$]*)*)\$\$")
+
+    # Ways to escape, matched in a single pass (leftmost wins, so code nested
+    # in a <pre> or ``` block is escaped along with its parent)
+    _escape_re = re.compile(
+        r"(?P<pre>(?s:<pre>.*?</pre>))"  # Wraped in <pre>
+        r"|(?P<triple>(?s:```.*?```))"  # Wrapped in a code block ```
+        r"|(?P<single>(?<!`)`.*?(?<!`)`(?!`))"  # Wrapped in a single `
+    )
 
-    # Ways to escape
-    _pre_code_block_re = re.compile(r"<pre>(.*?)</pre>", re.DOTALL)  # Wraped in <pre>
-    _triple_re = re.compile(r"```(.*?)```", re.DOTALL)  # Wrapped in a code block ```
-    _single_re = re.compile(r"(?<!`)(`)(.*?)(?<!`)\1(?!`)")  # Wrapped in a single `
+    code_blocks = None
 
-    converter = None
-    code_blocks = {}
+    # The same equations show up many times across documents, so cache them
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def _mathml_inline(equation):
+        return latex2mathml.converter.convert(equation)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=2048)
+    def _mathml_block(equation):
+        return latex2mathml.converter.convert(equation, display="block")
 
     def _convert_single_match(self, match):
-        return self.converter.convert(match.group(1))
+        return self._mathml_inline(match.group(1))
 
     def _convert_double_match(self, match):
-        return self.converter.convert(
-            match.group(1).replace(r"\n", ""), display="block"
-        )
+        return self._mathml_block(match.group(1).replace(r"\n", ""))
+
+    # NUL is not expected in markdown, so it delimits the placeholders
+    _placeholder_re = re.compile(r"\0(\d+)\0")
 
     def code_placeholder(self, match):
-        placeholder = f"<!--CODE_BLOCK_{len(self.code_blocks)}-->"
-        self.code_blocks[placeholder] = match.group(0)
-        return placeholder
+        index = len(self.code_blocks)
+        self.code_blocks.append(match.group(0))
+        return f"\0{index}\0"
 
-    def run(self, text):
-        try:
-            import latex2mathml.converter
+    def _restore_code_block(self, match):
+        index = int(match.group(1))
+        if index < len(self.code_blocks):
+            return self.code_blocks[index]
+        return match.group(0)  # Not one of our placeholders, leave it as is
 
-            self.converter = latex2mathml.converter
-        except ImportError:
-            raise ImportError(
-                'The "latex" extra requires the "latex2mathml" package to be installed.'
-            )
+    def run(self, text):
+        self.code_blocks = []
 
+        # Cheap substring checks let us skip the regex passes that can't match
         # Escape by replacing with a code block
-        text = self._pre_code_block_re.sub(self.code_placeholder, text)
-        text = self._single_re.sub(self.code_placeholder, text)
-        text = self._triple_re.sub(self.code_placeholder, text)
+        if "`" in text or "<pre>" in text:
+            text = self._escape_re.sub(self.code_placeholder, text)
 
-        text = self._single_dollar_re.sub(self._convert_single_match, text)
-        text = self._double_dollar_re.sub(self._convert_double_match, text)
+        if "$" in text:
+            text = self._single_dollar_re.sub(self._convert_single_match, text)
+            text = self._double_dollar_re.sub(self._convert_double_match, text)
 
         # Convert placeholder tag back to original code
-        for placeholder, code_block in self.code_blocks.items():
-            text = text.replace(placeholder, code_block)
+        if self.code_blocks:
+            text = self._placeholder_re.sub(self._restore_code_block, text)
 
         return text
 
 
+latex = Latex()
+
+
 def recursive_folder_conversion(input_dir, output_dir):
     if not os.path.isdir(input_dir):
         raise ValueError(
@@ -184,6 +273,8 @@ def recursive_folder_conversion(input_dir, output_dir):
             "Output path must be a directory when using the --recursive option"
         )
 
+    config = {"section_headers": True}  # Enable section headers
+    keys = set()
     for md_file in Path(input_dir).rglob("*.md"):
         input_path = str(md_file)
 
@@ -194,11 +285,18 @@ def recursive_folder_conversion(input_dir, output_dir):
         )
 
         # convert
-        config = {"section_headers": True}  # Enable section headers
-        metadata, html_output = convert_markdown_to_html(input_path, config)
-        html_output = html_to_respec(metadata, html_output)
-        with open(output_path, "w") as f:
-            f.write(html_output)
+        keys.add(convert_file(input_path, output_path, config))
+
+    # Drop the entries left behind by earlier versions of the documents
+    prune_cache(keys)
+
+
+def convert_file(input_path, output_path, config):
+    metadata, html_output, key = convert_markdown_to_html(input_path, config)
+    html_output = html_to_respec(metadata, html_output)
+    with open(output_path, "w") as f:
+        f.write(html_output)
+    return key
 
 
 def main():
@@ -231,7 +329,7 @@ def main():
 
     # convert
     config = {"section_headers": True}  # Enable section headers
-    metadata, html_output = convert_markdown_to_html(args.input_path, config)
+    metadata, html_output, _ = convert_markdown_to_html(args.input_path, config)
 
     if not args.pure_html:
         html_output = html_to_respec(metadata, html_output)